@@ -1,53 +1,250 @@
+import ctypes
+import functools
+import logging
+import mmap
 import os
-import random
 import time
-from collections import Counter
+import weakref
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
-from multiprocessing import Manager
-from typing import Dict, List, Callable, Union, Type
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Callable, Optional, Union, Type
 
+import numpy as np
+from numba import njit
+
+logger = logging.getLogger(__name__)
+
+# every chunk result is a fixed-size histogram indexed by byte value, so all chunks share one layout
+NUM_BYTE_VALUES = 256
+COUNT_DTYPE = np.int64
+# alphabets up to this size are counted with the SWAR kernel instead of a full histogram
+SWAR_MAX_LETTERS = 8
+
+_SWAR_ONES = np.uint64(0x0101010101010101)
+_SWAR_LOW7 = np.uint64(0x7F7F7F7F7F7F7F7F)
+_SWAR_HIGH = np.uint64(0x8080808080808080)
+
+# input buffer of a worker process, set once per worker by _init_worker_mapping or _attach_shm
+_worker_input: Optional[Union[mmap.mmap, memoryview]] = None
+# keeps the worker's shared memory block attached while _worker_input views it
+_worker_shm: Optional[SharedMemory] = None
 
 
 def performance_decorator(func: Callable) -> Callable:
-    """Decorator to measure the performance of a function."""
+    """Decorator to measure the performance of a function.
+
+    The duration of the latest call is stored on the wrapper as `last_ms` for callers to report;
+    it is only logged when debug logging is enabled.
+    """
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         start_time = time.perf_counter()
         result = func(*args, **kwargs)
         end_time = time.perf_counter()
-        print(f"Time taken by {func.__name__}: {end_time - start_time:.4f} seconds")
+        wrapper.last_ms = (end_time - start_time) * 1000
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Time taken by %s: %.4f seconds", func.__name__, end_time - start_time)
         return result
+    wrapper.last_ms = None
     return wrapper
 
 
+@njit(cache=True, nogil=True, boundscheck=False)
+def _histogram(buf: np.ndarray) -> np.ndarray:
+    """Count the occurrences of each byte value in a uint8 buffer.
+
+    Uses four interleaved count arrays so that consecutive (often identical) bytes
+    do not serialize on a single counter's load-increment-store.
+    """
+    c0 = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    c1 = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    c2 = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    c3 = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    n = buf.shape[0]
+    end = n - n % 4
+    for i in range(0, end, 4):
+        c0[buf[i]] += 1
+        c1[buf[i + 1]] += 1
+        c2[buf[i + 2]] += 1
+        c3[buf[i + 3]] += 1
+    for i in range(end, n):
+        c0[buf[i]] += 1
+    return c0 + c1 + c2 + c3
+
+
+@njit(cache=True, nogil=True, boundscheck=False)
+def _count_letters_swar(buf: np.ndarray, letters: np.ndarray) -> np.ndarray:
+    """Count only the given letters in a uint8 buffer, comparing 8 bytes per 64-bit operation.
+
+    Each letter is broadcast to all bytes of a word; XOR turns matching bytes into zero bytes,
+    which are flagged without cross-byte carries and then summed with a multiply.
+    Bytes that are not in `letters` are not counted.
+    """
+    n_letters = letters.shape[0]
+    masks = np.empty(n_letters, dtype=np.uint64)
+    for t in range(n_letters):
+        masks[t] = _SWAR_ONES * np.uint64(letters[t])
+    counts = np.zeros(n_letters, dtype=np.uint64)
+    n_words = buf.shape[0] // 8
+    words = buf[:n_words * 8].view(np.uint64)
+    for i in range(n_words):
+        w = words[i]
+        for t in range(n_letters):
+            x = w ^ masks[t]
+            zero_bytes = ~(((x & _SWAR_LOW7) + _SWAR_LOW7) | x) & _SWAR_HIGH
+            counts[t] += ((zero_bytes >> np.uint64(7)) * _SWAR_ONES) >> np.uint64(56)
+    out = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    for t in range(n_letters):
+        out[letters[t]] = counts[t]
+    for i in range(n_words * 8, buf.shape[0]):
+        for t in range(n_letters):
+            if buf[i] == letters[t]:
+                out[letters[t]] += 1
+    return out
+
+
+def _load_native_histogram() -> Optional[Callable]:
+    """Load the optional C kernel built from hist_u8.c, or return None if it has not been built."""
+    lib_path = os.path.join(os.path.dirname(__file__), '_hist_u8.so')
+    try:
+        # CDLL (unlike PyDLL) releases the GIL for the duration of each call, so threads count in parallel
+        lib = ctypes.CDLL(lib_path)
+    except OSError:
+        return None
+    hist_u8 = lib.hist_u8
+    hist_u8.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+    hist_u8.restype = None
+    return hist_u8
+
+
+_native_hist_u8 = _load_native_histogram()
+
+
+def _native_histogram(buf: np.ndarray) -> np.ndarray:
+    """Count the occurrences of each byte value in a uint8 buffer using the C kernel."""
+    out = np.empty(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
+    _native_hist_u8(buf.ctypes.data, buf.shape[0], out.ctypes.data)
+    return out
+
+
+# whether the C kernel is faster than the Numba kernel on this machine, decided on first use
+_use_native_histogram: Optional[bool] = None
+
+
+def _best_time(kernel: Callable, buf: np.ndarray, repeats: int = 3) -> float:
+    """Return the fastest of a few timed runs of kernel on buf, after one warm-up run."""
+    kernel(buf)
+    best = float('inf')
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        kernel(buf)
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def _byte_histogram(buf: np.ndarray) -> np.ndarray:
+    """Count each byte value in buf with the C kernel if it is built and beats Numba, else with Numba."""
+    global _use_native_histogram
+    if _use_native_histogram is None:
+        sample = np.resize(np.frombuffer(b'ABCD', dtype=np.uint8), 1 << 18)
+        _use_native_histogram = (_native_hist_u8 is not None
+                                 and _best_time(_native_histogram, sample) < _best_time(_histogram, sample))
+    if _use_native_histogram:
+        return _native_histogram(buf)
+    return _histogram(buf)
+
+
+def _release_pool(pool: ProcessPoolExecutor, shm: Optional[SharedMemory]) -> None:
+    """Stop a process pool and free the shared memory its workers attached to."""
+    pool.shutdown()
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+
+def _map_file(file_path: str) -> mmap.mmap:
+    """Map the whole file read-only into memory."""
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+def _init_worker_mapping(file_path: str) -> None:
+    """Executor initializer: map the input file once per worker process."""
+    global _worker_input
+    _worker_input = _map_file(file_path)
+
+
+def _attach_shm(name: str, size: int) -> None:
+    """Executor initializer: attach to the shared memory block holding the input once per worker process."""
+    global _worker_input, _worker_shm
+    _worker_shm = SharedMemory(name=name)
+    # the block may be rounded up to a page size, so only expose the input itself
+    _worker_input = _worker_shm.buf[:size]
+
+
 class RandomLetterGenerator:
     def __init__(self, choices: str):
         self.choices = choices.split(",")
+        if any(len(c) != 1 or not c.isascii() for c in self.choices):
+            raise ValueError(f"choices must be single ASCII letters, got {choices!r}")
+        self._choices_u8 = np.frombuffer(''.join(self.choices).encode('ascii'), dtype=np.uint8)
+        self._rng = np.random.default_rng()
 
-    def generate(self, count: int) -> str:
-        """Generate a string of random letters from the set choices."""
-        return ''.join(random.choice(self.choices) for _ in range(count))
+    def generate(self, count: int) -> bytes:
+        """Generate a byte string of random letters from the set choices."""
+        k = len(self._choices_u8)
+        if k <= NUM_BYTE_VALUES and k & (k - 1) == 0:
+            # power-of-two alphabet: masking uniform random bytes picks each letter equally often
+            raw = np.frombuffer(os.urandom(count), dtype=np.uint8) & (k - 1)
+            return self._choices_u8[raw].tobytes()
+        return self._rng.choice(self._choices_u8, size=count).tobytes()
 
 
 class FileProcessor:
     def __init__(self, file_path: str):
         self.file_path = file_path
-
-    def write_file(self, content: str) -> None:
-        """Write content to the file."""
-        with open(self.file_path, 'w') as f:
+        self._fd: Optional[int] = None
+        # closes the descriptor if the processor is collected or the interpreter exits unclosed
+        self._fd_finalizer: Optional[weakref.finalize] = None
+
+    def __getstate__(self) -> dict:
+        # file descriptors are per process; a copy in a worker opens its own on first read
+        state = self.__dict__.copy()
+        state['_fd'] = None
+        state['_fd_finalizer'] = None
+        return state
+
+    def close(self) -> None:
+        """Close the descriptor used by read_chunk."""
+        if self._fd_finalizer is not None:
+            self._fd_finalizer()
+            self._fd_finalizer = None
+        self._fd = None
+
+    def write_file(self, content: bytes) -> None:
+        """Write raw content to the file."""
+        with open(self.file_path, 'wb') as f:
             f.write(content)
 
-    def read_chunk(self, start: int, size: int) -> str:
-        """Read a chunk of the file."""
-        with open(self.file_path, 'r') as f:
-            f.seek(start)
-            return f.read(size)
-
-    def write_counts_to_files(self, letter_counts: Dict[str, int]) -> None:
-        """Write the counts to their respective files."""
-        for letter, count in letter_counts.items():
-            with open(f'{letter}.txt', 'w') as f:
-                f.write(str(count))
+    def read_chunk(self, start: int, size: int) -> bytes:
+        """Read a chunk of the file as raw bytes."""
+        # pread takes the offset directly, so concurrent readers don't contend on a shared file position
+        if self._fd is None:
+            self._fd = os.open(self.file_path, os.O_RDONLY)
+            self._fd_finalizer = weakref.finalize(self, os.close, self._fd)
+        return os.pread(self._fd, size, start)
+
+    def write_counts_to_files(self, counts: np.ndarray) -> None:
+        """Write the non-zero counts of a 256-entry byte histogram to their respective files."""
+        for i in np.nonzero(counts)[0]:
+            fd = os.open(f'{chr(i)}.txt', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, str(int(counts[i])).encode())
+            finally:
+                os.close(fd)
 
     def get_file_size(self) -> int:
         """Get the size of the file."""
@@ -55,23 +252,122 @@ class FileProcessor:
 
 
 class OccurrenceCalculator:
-    def __init__(self, file_processor: FileProcessor, chunk_size: int):
+    def __init__(self, file_processor: FileProcessor, chunk_size: int, data: Optional[bytes] = None,
+                 letters: Optional[str] = None):
+        """`data` is the file's content when it is already in memory; the multiprocessing path
+        then shares it with workers through shared memory instead of reading the file.
+        `letters` is the file's alphabet when it is known; small alphabets are counted with a
+        specialized kernel that ignores any other byte."""
         self.file_processor = file_processor
         self.chunk_size = chunk_size
-
-    def count_letters_in_chunk(self, chunk: str) -> Counter:
-        """Count the occurrences of each letter in the chunk. (ex. AAB will become {'A': 2, 'B':1})"""
-        return Counter(chunk)
+        self.data = data
+        self._swar_letters: Optional[np.ndarray] = None
+        if letters is not None:
+            if not letters:
+                raise ValueError("letters must not be empty")
+            # each letter must appear once, or the SWAR kernel would count it repeatedly
+            unique_letters = np.unique(np.frombuffer(letters.encode('ascii'), dtype=np.uint8))
+            if len(unique_letters) <= SWAR_MAX_LETTERS:
+                self._swar_letters = unique_letters
+        self._mm: Optional[mmap.mmap] = None
+        # process pool reused across calls, with the input its workers were initialized for
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_input_size: Optional[int] = None
+        self._shm: Optional[SharedMemory] = None
+        # releases the pool and shared memory if the calculator is collected or the interpreter exits unclosed
+        self._pool_finalizer: Optional[weakref.finalize] = None
+
+    def __enter__(self) -> 'OccurrenceCalculator':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        # mmaps and pools cannot be pickled and the data must not be re-sent with every task;
+        # worker processes get their input once via _init_worker_mapping or _attach_shm instead
+        state = self.__dict__.copy()
+        state['_mm'] = None
+        state['data'] = None
+        state['_pool'] = None
+        state['_shm'] = None
+        state['_pool_finalizer'] = None
+        return state
+
+    def _input_buffer(self) -> Union[mmap.mmap, memoryview]:
+        """Return the buffer chunks are read from, mapping the input file on first use."""
+        if _worker_input is not None:
+            return _worker_input
+        if self._mm is None:
+            self._mm = _map_file(self.file_processor.file_path)
+        return self._mm
+
+    def _refresh_mapping(self, file_size: int) -> None:
+        """Map the input file, remapping it if it was rewritten at a different size since it was mapped."""
+        if self._mm is not None and len(self._mm) != file_size:
+            self._mm.close()
+            self._mm = None
+        # an empty file cannot be mapped, but it has no chunks to read either
+        if self._mm is None and file_size > 0:
+            self._mm = _map_file(self.file_processor.file_path)
+
+    def _process_pool(self, input_size: int) -> ProcessPoolExecutor:
+        """Return the cached process pool, starting it and sharing the input with its workers on first use."""
+        if self._pool is not None and (self._pool_input_size != input_size
+                                       or (self.data is not None) != (self._shm is not None)):
+            # the workers were initialized for an input of a different size or source
+            self._shutdown_pool()
+        if self._pool is not None and self._shm is not None:
+            # data may have changed in place of the same length; one copy keeps the workers
+            self._shm.buf[:input_size] = self.data
+        if self._pool is None:
+            if self.data is not None:
+                self._shm = SharedMemory(create=True, size=max(input_size, 1))
+                self._shm.buf[:input_size] = self.data
+                initializer, initargs = _attach_shm, (self._shm.name, input_size)
+            else:
+                initializer, initargs = _init_worker_mapping, (self.file_processor.file_path,)
+            self._pool = ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=initializer, initargs=initargs)
+            self._pool_input_size = input_size
+            self._pool_finalizer = weakref.finalize(self, _release_pool, self._pool, self._shm)
+        return self._pool
+
+    def _shutdown_pool(self) -> None:
+        """Stop the cached process pool and free the shared memory its workers attached to."""
+        if self._pool_finalizer is not None:
+            self._pool_finalizer()
+            self._pool_finalizer = None
+        self._pool = None
+        self._pool_input_size = None
+        self._shm = None
+
+    def close(self) -> None:
+        """Release the mapping of the input file, the cached process pool and the file's descriptor."""
+        self._shutdown_pool()
+        self.file_processor.close()
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def count_letters_in_chunk(self, chunk: Union[bytes, memoryview]) -> np.ndarray:
+        """Count the occurrences of each byte in the chunk. (ex. b'AAB' will have 2 at index 65 and 1 at index 66)"""
+        buf = np.frombuffer(chunk, dtype=np.uint8)
+        if self._swar_letters is not None:
+            return _count_letters_swar(buf, self._swar_letters)
+        return _byte_histogram(buf)
+
+    def to_letter_counts(self, counts: np.ndarray) -> Dict[str, int]:
+        """Convert a 256-entry byte histogram into a {letter: count} dict, skipping zeros."""
+        return {chr(i): int(counts[i]) for i in np.nonzero(counts)[0]}
 
     @performance_decorator
     def count_letter_occurrence_sequential(self) -> Dict[str, int]:
         """Count letter occurrences in the file sequentially."""
-        counts = Counter()
-        with open(self.file_processor.file_path, 'r') as f:
+        with open(self.file_processor.file_path, 'rb') as f:
             data = f.read()
-            counts = self.count_letters_in_chunk(data)
+        counts = self.count_letters_in_chunk(data)
         self.file_processor.write_counts_to_files(counts)
-        return counts
+        return self.to_letter_counts(counts)
 
     @performance_decorator
     def count_letter_occurrence_threading(self) -> Dict[str, int]:
@@ -85,42 +381,46 @@ class OccurrenceCalculator:
 
     def _count_letter_occurrence_concurrent(self, executor_cls: Type[Union[ThreadPoolExecutor, ProcessPoolExecutor]]) -> Dict[str, int]:
         """Count letter occurrences in the file using concurrent execution."""
-        with Manager() as manager:
-            queue = manager.Queue()
-            file_size = self.file_processor.get_file_size()
-            num_chunks = (file_size + self.chunk_size - 1) // self.chunk_size
-            
+        use_shm = issubclass(executor_cls, ProcessPoolExecutor) and self.data is not None
+        file_size = len(self.data) if use_shm else self.file_processor.get_file_size()
+        # give each worker a few large chunks rather than many small ones; chunk_size acts as a floor
+        chunk_size = max(self.chunk_size, file_size // ((os.cpu_count() or 1) * 4))
+        num_chunks = (file_size + chunk_size - 1) // chunk_size
+        starts = [i * chunk_size for i in range(num_chunks)]
+        sizes = [chunk_size] * num_chunks
+
+        # each worker returns its chunk's histogram directly, so results come back through the
+        # executor's own result pipe instead of a Manager-proxied queue
+        map_chunksize = max(1, num_chunks // ((os.cpu_count() or 1) * 4))
+        if issubclass(executor_cls, ProcessPoolExecutor):
+            # worker processes are expensive to start, so the pool is kept for later calls
+            executor = self._process_pool(file_size)
+            counts_list = list(executor.map(self.process_chunk, starts, sizes, chunksize=map_chunksize))
+        else:
+            # map before any task is submitted so worker threads share one up-to-date mapping
+            self._refresh_mapping(file_size)
             with executor_cls() as executor:
-                futures = [
-                    executor.submit(self.process_chunk, i * self.chunk_size, self.chunk_size, queue)
-                    for i in range(num_chunks)
-                ]
-                for future in futures:
-                    future.result()  # Wait for all threads/processes to complete
-
-            counts_list = []
-            while not queue.empty():
-                counts_list.append(queue.get())
-
-            # each chunk implements its own Counter object, so if we have 10 chunks we will have 10 
-            # Counter objects. However, for final results we need to group all Counter data 
-            # into one to output the results
-            combined_counts = self.combine_counts(counts_list)
-
-            self.file_processor.write_counts_to_files(combined_counts)
-            return combined_counts
-
-    def process_chunk(self, start: int, size: int, queue) -> None:
-        """Process a chunk of the file and update shared counts."""
-        chunk = self.file_processor.read_chunk(start, size)
-        chunk_counts = self.count_letters_in_chunk(chunk)
-        queue.put(chunk_counts)
-
-    def combine_counts(self, counts_list: List[Counter]) -> Counter:
-        """Combine a list of Counter objects into one Counter."""
-        total_counts = Counter()
+                counts_list = list(executor.map(self.process_chunk, starts, sizes, chunksize=map_chunksize))
+
+        # each chunk produces its own 256-entry histogram, so if we have 10 chunks we will have 10
+        # arrays. However, for final results we need to sum them into one to output the results
+        combined_counts = self.combine_counts(counts_list)
+
+        self.file_processor.write_counts_to_files(combined_counts)
+        return self.to_letter_counts(combined_counts)
+
+    def process_chunk(self, start: int, size: int) -> np.ndarray:
+        """Process a chunk of the file and return its byte histogram."""
+        # slicing a memoryview of the input is zero-copy; the view is released before returning
+        with memoryview(self._input_buffer())[start:start + size] as chunk:
+            return self.count_letters_in_chunk(chunk)
+
+    def combine_counts(self, counts_list: List[np.ndarray]) -> np.ndarray:
+        """Combine a list of per-chunk histograms into one histogram."""
+        # accumulate in place so neither a stacked copy nor per-chunk temporaries are allocated
+        total_counts = np.zeros(NUM_BYTE_VALUES, dtype=COUNT_DTYPE)
         for counts in counts_list:
-            total_counts.update(counts)
+            np.add(total_counts, counts, out=total_counts)
         return total_counts
 
 
@@ -136,7 +436,8 @@ def main() -> None:
     file_processor.write_file(random_letters)
 
     # Create an instance of OccurrenceCalculator
-    calculator = OccurrenceCalculator(file_processor, chunk_size)
+    calculator = OccurrenceCalculator(file_processor, chunk_size, data=random_letters,
+                                      letters=''.join(generator.choices))
 
     # Measure performance of counting letter occurrences sequentially
     calculator.count_letter_occurrence_sequential()
@@ -147,6 +448,15 @@ def main() -> None:
     # Measure performance of counting letter occurrences using multiprocessing
     calculator.count_letter_occurrence_multiprocessing()
 
+    calculator.close()
+
+    for method in (
+        OccurrenceCalculator.count_letter_occurrence_sequential,
+        OccurrenceCalculator.count_letter_occurrence_threading,
+        OccurrenceCalculator.count_letter_occurrence_multiprocessing,
+    ):
+        print(f"Time taken by {method.__name__}: {method.last_ms / 1000:.4f} seconds")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,57 @@
+/*
+ * Native byte histogram kernel, used by letter_counter.counter when it is built and outperforms Numba.
+ *
+ * Build it next to this file (counter.py uses the Numba kernel if it is missing or slower):
+ *
+ *     gcc -O3 -march=native -shared -fPIC -o letter_counter/_hist_u8.so letter_counter/hist_u8.c
+ */
+#include <stddef.h>
+#include <stdint.h>
+#include <string.h>
+
+/* Each of the four private counters sees a quarter of a block, so uint32_t cannot overflow. */
+#define BLOCK_SIZE ((size_t)1 << 30)
+
+/* Consecutive bytes go to different counter arrays so repeated letters don't serialize on one slot. */
+static inline void hist_word(uint64_t x, uint32_t h[4][256])
+{
+    h[0][x & 0xff]++;
+    h[1][(x >> 8) & 0xff]++;
+    h[2][(x >> 16) & 0xff]++;
+    h[3][(x >> 24) & 0xff]++;
+    h[0][(x >> 32) & 0xff]++;
+    h[1][(x >> 40) & 0xff]++;
+    h[2][(x >> 48) & 0xff]++;
+    h[3][x >> 56]++;
+}
+
+static void hist_block(const uint8_t *p, size_t n, uint32_t h[4][256])
+{
+    size_t i = 0;
+    for (; i + 8 <= n; i += 8) {
+        uint64_t x;
+        memcpy(&x, p + i, sizeof(x));
+        hist_word(x, h);
+    }
+    for (; i < n; i++) {
+        h[i & 3][p[i]]++;
+    }
+}
+
+void hist_u8(const uint8_t *p, size_t n, int64_t out[256])
+{
+    uint32_t h[4][256];
+
+    memset(out, 0, 256 * sizeof(int64_t));
+    while (n > 0) {
+        size_t len = n < BLOCK_SIZE ? n : BLOCK_SIZE;
+
+        memset(h, 0, sizeof(h));
+        hist_block(p, len, h);
+        for (int b = 0; b < 256; b++) {
+            out[b] += (int64_t)h[0][b] + h[1][b] + h[2][b] + h[3][b];
+        }
+        p += len;
+        n -= len;
+    }
+}
@@ -1,23 +1,57 @@
+import gc
 import unittest
 import os
 from collections import Counter
-from tempfile import NamedTemporaryFile
+from multiprocessing.shared_memory import SharedMemory
+from tempfile import NamedTemporaryFile, TemporaryDirectory
 from unittest.mock import patch
 
+import numpy as np
 
+
+from letter_counter import counter
 from letter_counter.counter import (
+    performance_decorator,
     RandomLetterGenerator,
     FileProcessor,
     OccurrenceCalculator,
 )
 
 
+class TestPerformanceDecorator(unittest.TestCase):
+    def test_records_last_call_duration(self):
+        @performance_decorator
+        def work():
+            return 42
+
+        self.assertIsNone(work.last_ms)
+        with patch("builtins.print") as mock_print:
+            self.assertEqual(work(), 42)
+        mock_print.assert_not_called()
+        self.assertGreaterEqual(work.last_ms, 0)
+        self.assertEqual(work.__name__, "work")
+
+
 class TestRandomLetterGenerator(unittest.TestCase):
     def test_generate(self):
         generator = RandomLetterGenerator("A,B,C,D")
         result = generator.generate(10)
         self.assertEqual(len(result), 10)
-        self.assertTrue(all(c in "ABCD" for c in result))
+        self.assertTrue(all(c in b"ABCD" for c in result))
+
+    def test_generate_non_power_of_two_choices(self):
+        generator = RandomLetterGenerator("A,B,C")
+        result = generator.generate(1000)
+        self.assertEqual(len(result), 1000)
+        self.assertEqual(set(result), set(b"ABC"))
+
+    def test_generate_power_of_two_choices_above_byte_range(self):
+        generator = RandomLetterGenerator(",".join("A" * 512))
+        self.assertEqual(generator.generate(5), b"AAAAA")
+
+    def test_generate_rejects_multi_character_choices(self):
+        with self.assertRaises(ValueError):
+            RandomLetterGenerator("AB,C")
 
 
 class TestFileProcessor(unittest.TestCase):
@@ -27,24 +61,50 @@ class TestFileProcessor(unittest.TestCase):
         self.processor = FileProcessor(self.file_path)
 
     def tearDown(self):
+        self.processor.close()
         os.remove(self.temp_file.name)
 
     def test_write_file(self):
-        content = "ABCD" * 25
+        content = b"ABCD" * 25
         self.processor.write_file(content)
-        with open(self.file_path, "r") as file:
+        with open(self.file_path, "rb") as file:
             self.assertEqual(file.read(), content)
 
     def test_read_chunk(self):
-        content = "ABCD" * 25
+        content = b"ABCD" * 25
         self.processor.write_file(content)
         chunk_size = 10
         chunk = self.processor.read_chunk(0, chunk_size)
-        self.assertEqual(chunk, "ABCDABCDAB")
+        self.assertEqual(chunk, b"ABCDABCDAB")
         self.assertEqual(len(chunk), chunk_size)
+        self.assertEqual(self.processor.read_chunk(96, chunk_size), b"ABCD")
+
+    def test_write_counts_to_files(self):
+        counts = np.zeros(256, dtype=np.int64)
+        counts[ord("A")] = 3
+        counts[ord("C")] = 7
+        with TemporaryDirectory() as out_dir:
+            cwd = os.getcwd()
+            os.chdir(out_dir)
+            try:
+                self.processor.write_counts_to_files(counts)
+            finally:
+                os.chdir(cwd)
+            self.assertEqual(sorted(os.listdir(out_dir)), ["A.txt", "C.txt"])
+            with open(os.path.join(out_dir, "C.txt")) as file:
+                self.assertEqual(file.read(), "7")
+
+    def test_read_chunk_descriptor_closed_when_collected(self):
+        processor = FileProcessor(self.file_path)
+        processor.read_chunk(0, 1)
+        fd = processor._fd
+        del processor
+        gc.collect()
+        with self.assertRaises(OSError):
+            os.fstat(fd)
 
     def test_get_file_size(self):
-        content = "ABCD"
+        content = b"ABCD"
         self.processor.write_file(content)
         size = self.processor.get_file_size()
         self.assertEqual(size, 4)
@@ -55,15 +115,69 @@ class TestOccurrenceCalculator(unittest.TestCase):
         self.temp_file = NamedTemporaryFile(delete=False)
         self.file_path = self.temp_file.name
         self.file_processor = FileProcessor(self.file_path)
-        content = "AABBBCCCCDDDD" * 100
+        content = b"AABBBCCCCDDDD" * 100
         self.file_processor.write_file(content)
         
         self.calculator = OccurrenceCalculator(self.file_processor, chunk_size=10)
 
 
     def tearDown(self):
+        self.calculator.close()
         os.remove(self.temp_file.name)
 
+    def test_count_letters_in_chunk(self):
+        counts = self.calculator.count_letters_in_chunk(b"AAB")
+        self.assertEqual(len(counts), 256)
+        self.assertEqual(counts[ord("A")], 2)
+        self.assertEqual(counts[ord("B")], 1)
+        self.assertEqual(self.calculator.to_letter_counts(counts), {"A": 2, "B": 1})
+
+    @unittest.skipIf(counter._native_hist_u8 is None, "native histogram kernel not built")
+    def test_native_histogram_matches_numba(self):
+        buf = np.random.default_rng(0).integers(0, 256, size=1003, dtype=np.uint8)
+        np.testing.assert_array_equal(counter._native_histogram(buf), counter._histogram(buf))
+
+    def test_count_letters_swar_matches_histogram(self):
+        # odd length so the scalar tail is exercised too
+        buf = np.frombuffer(b"AABBBCCCCDDDDX" * 37 + b"ABC", dtype=np.uint8)
+        expected = counter._histogram(buf)
+        expected[ord("X")] = 0
+        np.testing.assert_array_equal(counter._count_letters_swar(buf, np.frombuffer(b"ABCD", dtype=np.uint8)), expected)
+
+    def test_count_letter_occurrence_threading_with_letters(self):
+        calculator = OccurrenceCalculator(self.file_processor, chunk_size=10, letters="ABCD")
+        self.addCleanup(calculator.close)
+        result = calculator.count_letter_occurrence_threading()
+        self.assertEqual(result, Counter("AABBBCCCCDDDD" * 100))
+
+    def test_count_letters_with_duplicate_letters(self):
+        self.file_processor.write_file(b"A" * 1003)
+        calculator = OccurrenceCalculator(self.file_processor, chunk_size=10, letters="AABC")
+        self.addCleanup(calculator.close)
+        self.assertEqual(calculator.count_letter_occurrence_sequential(), {"A": 1003})
+        self.assertEqual(calculator.count_letter_occurrence_threading(), {"A": 1003})
+
+    def test_empty_letters_rejected(self):
+        with self.assertRaises(ValueError):
+            OccurrenceCalculator(self.file_processor, chunk_size=10, letters="")
+
+    def test_process_chunk(self):
+        counts = self.calculator.process_chunk(0, 13)
+        self.assertEqual(counts.shape, (256,))
+        self.assertEqual(counts.dtype, np.int64)
+        self.assertEqual(self.calculator.to_letter_counts(counts), {"A": 2, "B": 3, "C": 4, "D": 4})
+
+    def test_combine_counts(self):
+        chunks = [self.calculator.count_letters_in_chunk(b"AB"), self.calculator.count_letters_in_chunk(b"BC")]
+        combined = self.calculator.combine_counts(chunks)
+        self.assertEqual(self.calculator.to_letter_counts(combined), {"A": 1, "B": 2, "C": 1})
+        self.assertEqual(self.calculator.combine_counts([]).sum(), 0)
+
+    def test_close_closes_file_processor_descriptor(self):
+        self.file_processor.read_chunk(0, 1)
+        self.calculator.close()
+        self.assertIsNone(self.file_processor._fd)
+
     def test_count_letter_occurrence_sequential(self):
         expected_counts = Counter("AABBBCCCCDDDD" * 100)
         result = self.calculator.count_letter_occurrence_sequential()
@@ -79,6 +193,63 @@ class TestOccurrenceCalculator(unittest.TestCase):
         result = self.calculator.count_letter_occurrence_multiprocessing()
         self.assertEqual(result, expected_counts)
 
+    def test_concurrent_counts_cover_every_chunk(self):
+        # 1301 bytes is not a multiple of any chunk size used, so a dropped result would show up
+        self.file_processor.write_file(b"AABBBCCCCDDDD" * 100 + b"A")
+        for count in (self.calculator.count_letter_occurrence_threading,
+                      self.calculator.count_letter_occurrence_multiprocessing):
+            result = count()
+            self.assertEqual(sum(result.values()), 1301)
+            self.assertEqual(result["A"], 201)
+
+    def test_multiprocessing_reuses_process_pool(self):
+        self.calculator.count_letter_occurrence_multiprocessing()
+        pool = self.calculator._pool
+        result = self.calculator.count_letter_occurrence_multiprocessing()
+        self.assertIs(self.calculator._pool, pool)
+        self.assertEqual(result, Counter("AABBBCCCCDDDD" * 100))
+        self.calculator.close()
+        self.assertIsNone(self.calculator._pool)
+
+    def test_threading_remaps_rewritten_file(self):
+        self.file_processor.write_file(b"AB" * 50)
+        self.assertEqual(self.calculator.count_letter_occurrence_threading(), {"A": 50, "B": 50})
+        self.file_processor.write_file(b"AB" * 500)
+        self.assertEqual(self.calculator.count_letter_occurrence_threading(), {"A": 500, "B": 500})
+
+    def test_multiprocessing_shares_updated_data(self):
+        calculator = OccurrenceCalculator(self.file_processor, chunk_size=10, data=b"AB" * 500)
+        self.addCleanup(calculator.close)
+        self.assertEqual(calculator.count_letter_occurrence_multiprocessing(), {"A": 500, "B": 500})
+        calculator.data = b"C" * 1000
+        self.assertEqual(calculator.count_letter_occurrence_multiprocessing(), {"C": 1000})
+
+    def test_context_manager_releases_process_pool(self):
+        with OccurrenceCalculator(self.file_processor, chunk_size=10, data=b"AB" * 500) as calculator:
+            self.assertEqual(calculator.count_letter_occurrence_multiprocessing(), {"A": 500, "B": 500})
+            shm_name = calculator._shm.name
+        self.assertIsNone(calculator._pool)
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=shm_name)
+
+    def test_unclosed_calculator_releases_process_pool_when_collected(self):
+        calculator = OccurrenceCalculator(self.file_processor, chunk_size=10, data=b"AB" * 500)
+        calculator.count_letter_occurrence_multiprocessing()
+        shm_name = calculator._shm.name
+        finalizer = calculator._pool_finalizer
+        del calculator
+        gc.collect()
+        self.assertFalse(finalizer.alive)
+        with self.assertRaises(FileNotFoundError):
+            SharedMemory(name=shm_name)
+
+    def test_count_letter_occurrence_multiprocessing_shared_memory(self):
+        content = b"AABBBCCCCDDDD" * 100
+        calculator = OccurrenceCalculator(self.file_processor, chunk_size=10, data=content)
+        self.addCleanup(calculator.close)
+        result = calculator.count_letter_occurrence_multiprocessing()
+        self.assertEqual(result, Counter(content.decode()))
+
 
 if __name__ == "__main__":
     unittest.main()